@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+try:  # POSIX only; on other platforms state updates are best-effort.
+    import fcntl
+except ImportError:  # pragma: no cover - depends on platform
+    fcntl = None  # type: ignore[assignment]
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class CircuitConfig:
+    window_size: int = 20
+    window_seconds: float = 300.0
+    min_calls: int = 4
+    failure_rate_threshold: float = 0.5
+    latency_threshold_seconds: float = 60.0
+    cooldown_seconds: float = 60.0
+
+
+def default_state_path() -> Path:
+    override = os.getenv("TESTGEN_CIRCUIT_STATE")
+    if override:
+        return Path(override)
+    return Path.home() / ".cache" / "testgen-cli" / "circuit.json"
+
+
+def _empty_entry() -> dict[str, Any]:
+    return {
+        "state": CLOSED,
+        "opened_at": 0.0,
+        "probe_id": "",
+        "probe_started_at": 0.0,
+        "samples": [],
+    }
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker backed by a small JSON state file.
+
+    Each provider keeps a rolling window of (timestamp, ok, latency) samples.
+    The circuit opens when the window's failure rate or mean latency crosses
+    its threshold. After a cooldown a single half-open probe is let through;
+    only that probe's outcome closes the circuit or re-opens it. Results of
+    calls that were already in flight when the circuit opened are ignored.
+
+    The state file is read and rewritten under an exclusive lock so that
+    concurrent workers and later invocations share the same view.
+    """
+
+    def __init__(
+        self,
+        state_path: Path,
+        config: CircuitConfig | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.state_path = Path(state_path)
+        self.config = config or CircuitConfig()
+        self._clock = clock
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        return cls(default_state_path())
+
+    def state(self, provider: str) -> str:
+        with self._locked_state() as data:
+            return data.get(provider, _empty_entry())["state"]
+
+    def allow_request(self, provider: str) -> str | None:
+        """
+        Return a request id if a call to `provider` may proceed, else None.
+
+        Pass the id back to `record_success`/`record_failure`.
+        """
+        now = self._clock()
+        request_id = uuid.uuid4().hex
+        with self._locked_state() as data:
+            entry = data.setdefault(provider, _empty_entry())
+            if entry["state"] == CLOSED:
+                return request_id
+
+            # Open, or half-open with a probe that never reported back.
+            started = entry["opened_at"] if entry["state"] == OPEN else entry["probe_started_at"]
+            if now - started < self.config.cooldown_seconds:
+                return None
+
+            entry["state"] = HALF_OPEN
+            entry["probe_id"] = request_id
+            entry["probe_started_at"] = now
+            return request_id
+
+    def record_success(self, provider: str, latency: float, request_id: str = "") -> None:
+        self._record(provider, True, latency, request_id)
+
+    def record_failure(self, provider: str, latency: float, request_id: str = "") -> None:
+        self._record(provider, False, latency, request_id)
+
+    def _record(self, provider: str, ok: bool, latency: float, request_id: str) -> None:
+        now = self._clock()
+        slow = latency >= self.config.latency_threshold_seconds
+        with self._locked_state() as data:
+            entry = data.setdefault(provider, _empty_entry())
+
+            if entry["state"] == OPEN:
+                # Late result of a call started before the circuit opened.
+                return
+
+            if entry["state"] == HALF_OPEN:
+                if not request_id or request_id != entry.get("probe_id"):
+                    return
+                if ok and not slow:
+                    data[provider] = _empty_entry()
+                else:
+                    entry["state"] = OPEN
+                    entry["opened_at"] = now
+                    entry["probe_id"] = ""
+                return
+
+            samples = [
+                s for s in entry["samples"] if now - s[0] <= self.config.window_seconds
+            ]
+            samples.append([now, ok, latency])
+            entry["samples"] = samples[-self.config.window_size :]
+
+            if self._should_trip(entry["samples"]):
+                entry["state"] = OPEN
+                entry["opened_at"] = now
+
+    def _should_trip(self, samples: list[list[Any]]) -> bool:
+        if len(samples) < self.config.min_calls:
+            return False
+        failures = sum(1 for s in samples if not s[1])
+        if failures / len(samples) >= self.config.failure_rate_threshold:
+            return True
+        mean_latency = sum(s[2] for s in samples) / len(samples)
+        return mean_latency >= self.config.latency_threshold_seconds
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[dict[str, Any]]:
+        lock_path = self.state_path.with_name(self.state_path.name + ".lock")
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(lock_path, "a+", encoding="utf-8")
+        except OSError:
+            # Unwritable state location: behave as an always-fresh breaker.
+            yield {}
+            return
+
+        with lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                data = self._read()
+                yield data
+                self._write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        # Normalise hand-edited or partially written entries so a bad state
+        # file degrades to a fresh breaker instead of crashing every run.
+        entries: dict[str, Any] = {}
+        for provider, entry in data.items():
+            if not isinstance(entry, dict):
+                continue
+            entry = {**_empty_entry(), **entry}
+            if entry["state"] not in (CLOSED, OPEN, HALF_OPEN):
+                entry["state"] = CLOSED
+            if not isinstance(entry["samples"], list):
+                entry["samples"] = []
+            entries[provider] = entry
+        return entries
+
+    def _write(self, data: dict[str, Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.state_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
@@ -2,8 +2,10 @@ import argparse
 import sys
 import os
 from .validate import validate_generated_tests
+from .coverage_gaps import measure_coverage_gaps, merge_generated_tests
 from .llm import (
     LLMGenerationError,
+    generate_tests_for_coverage_gaps,
     generate_unit_tests_for_function,
     regenerate_unit_tests_after_validation_failure,
 )
@@ -11,6 +13,7 @@ from .parse import extract_single_function_source
 from .sanitize import sanitize_function_source
 
 ERROR_MSG = "Error: This tool only generates unit tests for functions."
+MAX_GAP_FILL_ROUNDS = 2
 
 
 def _read_source_from_path_or_stdin(path: str | None) -> str:
@@ -26,6 +29,39 @@ def _read_source_from_path_or_stdin(path: str | None) -> str:
         return ""
 
 
+def _fill_coverage_gaps(sanitized: str, tests: str) -> str:
+    """
+    Repeatedly measure branch coverage of `tests` and ask the model only for
+    additional tests targeting the gaps. Any failure keeps the last accepted
+    module.
+    """
+    debug = os.getenv("TESTGEN_DEBUG") == "1"
+    for _ in range(MAX_GAP_FILL_ROUNDS):
+        gaps = measure_coverage_gaps(sanitized, tests)
+        if gaps is None:
+            if debug:
+                print("[DEBUG] Coverage could not be measured", file=sys.stderr)
+            break
+        if not gaps:
+            break
+
+        try:
+            additions = generate_tests_for_coverage_gaps(sanitized, tests, gaps)
+        except LLMGenerationError as exc:
+            if debug:
+                print(f"[DEBUG] LLM gap-fill error: {exc}", file=sys.stderr)
+            break
+
+        merged = merge_generated_tests(tests, additions)
+        result = validate_generated_tests(merged)
+        if not result.ok:
+            if debug:
+                print(f"[DEBUG] Gap-fill validation failed: {result.reason}", file=sys.stderr)
+            break
+        tests = merged
+    return tests
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(prog="testgen")
     parser.add_argument(
@@ -33,6 +69,11 @@ def main() -> None:
         nargs="?",
         help="Path to a Python file containing a single function. If omitted, reads from stdin.",
     )
+    parser.add_argument(
+        "--fill-coverage-gaps",
+        action="store_true",
+        help="Run the accepted tests under branch coverage and ask for extra tests for uncovered code.",
+    )
     args = parser.parse_args()
 
     src = _read_source_from_path_or_stdin(args.path)
@@ -78,6 +119,9 @@ def main() -> None:
             sys.exit(1)
         tests = retry_tests
 
+    if args.fill_coverage_gaps:
+        tests = _fill_coverage_gaps(sanitized, tests)
+
     sys.stdout.write(tests.strip() + "\n")
     sys.exit(0)
 
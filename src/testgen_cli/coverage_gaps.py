@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import ast
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .providers import API_KEY_ENV_VARS
+from .validate import drop_redefinitions
+
+TARGET_MODULE = "_testgen_target"
+RUN_TIMEOUT_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class CoverageGaps:
+    # Line numbers refer to the sanitized function source, starting at 1.
+    missing_lines: tuple[int, ...] = ()
+    # (from_line, to_line) pairs; a negative to_line means "exit the function".
+    missing_branches: tuple[tuple[int, int], ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.missing_lines or self.missing_branches)
+
+
+def _function_name(fn_source: str) -> Optional[str]:
+    try:
+        tree = ast.parse(fn_source)
+    except SyntaxError:
+        return None
+    if tree.body and isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return tree.body[0].name
+    return None
+
+
+def _bind_tests_to_target(tests: str, fn_name: str) -> str:
+    """
+    Drop any `from X import <fn_name>` the model guessed and import the
+    function from the generated target module instead, keeping any alias.
+    """
+    tree = ast.parse(tests)
+    asnames: list[Optional[str]] = [None]
+    body: list[ast.stmt] = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            names = []
+            for alias in node.names:
+                if alias.name != fn_name:
+                    names.append(alias)
+                elif alias.asname not in asnames:
+                    asnames.append(alias.asname)
+            if not names:
+                continue
+            node.names = names
+        body.append(node)
+
+    imports: list[ast.stmt] = [
+        ast.ImportFrom(
+            module=TARGET_MODULE, names=[ast.alias(name=fn_name, asname=asname)], level=0
+        )
+        for asname in asnames
+    ]
+    # `from __future__` imports must stay first.
+    insert_at = 0
+    for idx, node in enumerate(body):
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            insert_at = idx + 1
+    tree.body = body[:insert_at] + imports + body[insert_at:]
+    return ast.unparse(ast.fix_missing_locations(tree)) + "\n"
+
+
+def _modules_accessed_for(tests: str, fn_name: str) -> list[str]:
+    """
+    Names of modules the tests import whole and use as `module.<fn_name>`.
+
+    Modules that already exist (stdlib or installed) are never shadowed.
+    """
+    tree = ast.parse(tests)
+    bound: dict[str, str] = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if "." not in alias.name:
+                    bound[alias.asname or alias.name] = alias.name
+
+    modules: list[str] = []
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Attribute)
+            and node.attr == fn_name
+            and isinstance(node.value, ast.Name)
+            and node.value.id in bound
+        ):
+            module = bound[node.value.id]
+            if (
+                module not in modules
+                and module not in (TARGET_MODULE, "test_generated")
+                and module not in sys.stdlib_module_names
+                and importlib.util.find_spec(module) is None
+            ):
+                modules.append(module)
+    return modules
+
+
+def _sandbox_env() -> dict[str, str]:
+    """Environment for running generated tests, without provider API keys."""
+    secrets = set(API_KEY_ENV_VARS.values())
+    return {key: value for key, value in os.environ.items() if key not in secrets}
+
+
+def measure_coverage_gaps(fn_source: str, tests: str) -> Optional[CoverageGaps]:
+    """
+    Run `tests` under branch coverage against `fn_source` and report the
+    uncovered lines and branches.
+
+    Returns None when coverage cannot be measured (coverage not installed,
+    tests not importable, timeout).
+    """
+    if importlib.util.find_spec("coverage") is None:
+        return None
+
+    fn_name = _function_name(fn_source)
+    if fn_name is None:
+        return None
+
+    try:
+        bound_tests = _bind_tests_to_target(tests, fn_name)
+        module_aliases = _modules_accessed_for(tests, fn_name)
+    except SyntaxError:
+        return None
+
+    env = _sandbox_env()
+    with tempfile.TemporaryDirectory(prefix="testgen-cov-") as tmp:
+        workdir = Path(tmp)
+        target = workdir / f"{TARGET_MODULE}.py"
+        target.write_text(fn_source, encoding="utf-8")
+        for module in module_aliases:
+            (workdir / f"{module}.py").write_text(
+                f"from {TARGET_MODULE} import {fn_name}\n", encoding="utf-8"
+            )
+        (workdir / "test_generated.py").write_text(bound_tests, encoding="utf-8")
+        report = workdir / "coverage.json"
+
+        try:
+            run = subprocess.run(
+                [
+                    sys.executable, "-m", "coverage", "run", "--branch",
+                    f"--include={target}",
+                    "-m", "pytest", "-q", "-p", "no:cacheprovider", "test_generated.py",
+                ],
+                cwd=workdir,
+                env=env,
+                capture_output=True,
+                timeout=RUN_TIMEOUT_SECONDS,
+            )
+            # pytest exit codes: 0 = passed, 1 = some tests failed. Anything
+            # else means collection or usage errors, so coverage is meaningless.
+            if run.returncode not in (0, 1):
+                return None
+            subprocess.run(
+                [sys.executable, "-m", "coverage", "json", "-q", "-o", str(report)],
+                cwd=workdir,
+                env=env,
+                capture_output=True,
+                timeout=RUN_TIMEOUT_SECONDS,
+                check=True,
+            )
+            data = json.loads(report.read_text(encoding="utf-8"))
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return None
+
+    files = data.get("files", {})
+    if not files:
+        return None
+    file_report = next(iter(files.values()))
+    return CoverageGaps(
+        missing_lines=tuple(file_report.get("missing_lines", [])),
+        missing_branches=tuple(
+            (int(src), int(dst)) for src, dst in file_report.get("missing_branches", [])
+        ),
+    )
+
+
+def merge_generated_tests(existing: str, additions: str) -> str:
+    """
+    Append `additions` to `existing`, dropping added top-level functions and
+    imports whose names `existing` already defines or imports.
+    """
+    additions = drop_redefinitions(additions, existing)
+    if not additions.strip():
+        return existing.strip() + "\n"
+    return existing.rstrip() + "\n\n\n" + additions.strip() + "\n"
@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import ast
 import os
 import re
-from typing import Any
+import time
+from typing import Any, Callable
+
+from .circuit import CircuitBreaker
+from .coverage_gaps import CoverageGaps
+from .providers import API_KEY_ENV_VARS
+from .validate import drop_redefinitions, node_span, validate_generated_tests
 
 
 class LLMGenerationError(Exception):
@@ -79,7 +86,7 @@ def _build_user_prompt(fn_source: str) -> str:
     )
 
 
-def _generate_with_openai(fn_source: str) -> str:
+def _generate_with_openai(user_prompt: str) -> str:
     # OpenAI provider env vars:
     # - TESTGEN_LLM_PROVIDER=openai (default when unset)
     # - OPENAI_API_KEY=< OpenAI API key>
@@ -101,7 +108,7 @@ def _generate_with_openai(fn_source: str) -> str:
             temperature=0,
             input=[
                 {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": _build_user_prompt(fn_source)},
+                {"role": "user", "content": user_prompt},
             ],
         )
         return _strip_markdown_fences(_extract_openai_text(response))
@@ -111,7 +118,7 @@ def _generate_with_openai(fn_source: str) -> str:
         ) from exc
 
 
-def _generate_with_gemini(fn_source: str) -> str:
+def _generate_with_gemini(user_prompt: str) -> str:
     # Gemini provider env vars:
     # - TESTGEN_LLM_PROVIDER=gemini
     # - GEMINI_API_KEY=<Gemini API key>
@@ -136,7 +143,7 @@ def _generate_with_gemini(fn_source: str) -> str:
                 temperature=0,
                 system_instruction=SYSTEM_PROMPT,
             ),
-            contents=_build_user_prompt(fn_source),
+            contents=user_prompt,
         )
         return _strip_markdown_fences(getattr(response, "text", "") or "")
     except Exception as exc:
@@ -145,30 +152,206 @@ def _generate_with_gemini(fn_source: str) -> str:
         ) from exc
 
 
-def generate_unit_tests_for_function(fn_source: str) -> str:
-    provider = os.getenv("TESTGEN_LLM_PROVIDER", "openai").strip().lower()
+def _provider_generators() -> dict[str, Callable[[str], str]]:
+    return {
+        "openai": _generate_with_openai,
+        "gemini": _generate_with_gemini,
+    }
+
 
-    if provider == "openai":
-        code = _generate_with_openai(fn_source)
-    elif provider == "gemini":
-        code = _generate_with_gemini(fn_source)
-    else:
+def _generate_with_failover(user_prompt: str) -> str:
+    """
+    Call the selected provider, failing over to the other configured provider
+    while the selected one's circuit is open or its call fails.
+    """
+    provider = os.getenv("TESTGEN_LLM_PROVIDER", "openai").strip().lower()
+    generators = _provider_generators()
+    if provider not in generators:
         raise LLMGenerationError(
             f"Unsupported TESTGEN_LLM_PROVIDER value: {provider!r}. "
             "Supported providers: openai, gemini."
         )
 
+    env_var = API_KEY_ENV_VARS[provider]
+    if not os.getenv(env_var):
+        raise LLMGenerationError(f"Missing required environment variable: {env_var}")
+
+    candidates = [provider] + [
+        name
+        for name in generators
+        if name != provider and os.getenv(API_KEY_ENV_VARS[name])
+    ]
+
+    breaker = CircuitBreaker.from_env()
+    errors: list[str] = []
+    for name in candidates:
+        request_id = breaker.allow_request(name)
+        if request_id is None:
+            errors.append(f"{name}: circuit open")
+            continue
+
+        started = time.monotonic()
+        try:
+            code = generators[name](user_prompt)
+        except LLMGenerationError as exc:
+            breaker.record_failure(name, time.monotonic() - started, request_id)
+            errors.append(str(exc))
+            continue
+        breaker.record_success(name, time.monotonic() - started, request_id)
+        return code
+
+    raise LLMGenerationError("All providers unavailable. " + " | ".join(errors))
+
+
+def generate_unit_tests_for_function(fn_source: str) -> str:
+    code = _generate_with_failover(_build_user_prompt(fn_source))
     if not code:
         raise LLMGenerationError("Model returned empty output.")
     return code
+
+
+def _build_full_repair_prompt(fn_source: str, reason: str) -> str:
+    return (
+        "A previous attempt to generate pytest tests for the function below was rejected.\n"
+        f"Validation failure: {reason}\n"
+        "Generate the complete pytest test module again and avoid that failure.\n"
+        "Top-level code may contain ONLY imports, pytest fixtures, and test_* functions.\n\n"
+        "Sanitized function source follows.\n\n"
+        f"{fn_source}"
+    )
+
+
+def _build_patch_repair_prompt(fn_source: str, reason: str, rejected: str) -> str:
+    return (
+        "Some top-level nodes of a generated pytest module were rejected by the validator.\n"
+        f"Validation failure: {reason}\n"
+        "Return ONLY replacement Python code for the rejected nodes shown below.\n"
+        "Replacement code may contain ONLY imports, pytest fixtures, and test_* functions.\n"
+        "Do not repeat the rest of the module. Return nothing if the nodes should simply be removed.\n\n"
+        "Sanitized function source follows.\n\n"
+        f"{fn_source}\n\n"
+        "Rejected nodes follow.\n\n"
+        f"{rejected}"
+    )
+
+
+def _spans_share_lines_with_kept_nodes(
+    output: str, spans: tuple[tuple[int, int], ...]
+) -> bool:
+    """
+    True if a rejected span shares a line with a node that was not rejected,
+    e.g. `import os; X = 1`, where a line-based splice would drop `import os`.
+    """
+    # Spans alone cannot tell `import os; X = 1` apart from a lone `X = 1`,
+    # so every node overlapping a rejected span must be one of the rejected.
+    overlapping = 0
+    for node in ast.parse(output).body:
+        start, end = node_span(node)
+        if any(start <= span_end and span_start <= end for span_start, span_end in spans):
+            overlapping += 1
+    return overlapping > len(spans)
+
+
+def _splice_repair_patch(
+    output: str, spans: tuple[tuple[int, int], ...], patch: str
+) -> str:
+    """
+    Replace the given 1-based line spans of `output` with `patch`.
+
+    The patch is inserted where the first span started; the remaining spans
+    are dropped.
+    """
+    lines = output.splitlines()
+    drop: set[int] = set()
+    for start, end in spans:
+        drop.update(range(start - 1, end))
+    insert_at = min(start for start, _ in spans) - 1
+
+    spliced: list[str] = []
+    for idx, line in enumerate(lines):
+        if idx == insert_at and patch.strip():
+            spliced.extend(patch.strip().splitlines())
+        if idx not in drop:
+            spliced.append(line)
+    return "\n".join(spliced).strip() + "\n"
+
+
 def regenerate_unit_tests_after_validation_failure(
     fn_source: str, invalid_output: str, reason: str
 ) -> str:
     """
     Retry generation after a validation failure.
 
-    Minimal fallback implementation: reuse the normal generation path.
-    This keeps CLI retry wiring working even if a dedicated repair prompt
-    implementation is not present.
+    When the validator can locate the offending top-level nodes, only those
+    nodes and the failure reason are sent, and the returned patch is spliced
+    back into the otherwise valid output. Failures that cannot be located
+    (syntax errors, prose, fences), or rejected nodes that share a line with
+    accepted ones, fall back to a full regeneration that includes the
+    failure reason.
     """
-    return generate_unit_tests_for_function(fn_source)
+    spans = validate_generated_tests(invalid_output).offending_spans
+    if not spans or _spans_share_lines_with_kept_nodes(invalid_output, spans):
+        code = _generate_with_failover(_build_full_repair_prompt(fn_source, reason))
+        if not code:
+            raise LLMGenerationError("Model returned empty output.")
+        return code
+
+    lines = invalid_output.splitlines()
+    rejected = "\n\n".join("\n".join(lines[start - 1 : end]) for start, end in spans)
+    patch = _generate_with_failover(_build_patch_repair_prompt(fn_source, reason, rejected))
+    # The model may repeat accepted tests despite the prompt; keep the originals.
+    patch = drop_redefinitions(patch, _splice_repair_patch(invalid_output, spans, ""))
+    return _splice_repair_patch(invalid_output, spans, patch)
+
+
+def _number_lines(source: str) -> str:
+    return "\n".join(f"{idx:>4}  {line}" for idx, line in enumerate(source.splitlines(), 1))
+
+
+def _build_coverage_gap_prompt(
+    fn_source: str,
+    existing_test_names: list[str],
+    existing_imports: list[str],
+    gaps: CoverageGaps,
+) -> str:
+    gap_lines = [f"- line {line} is never executed" for line in gaps.missing_lines]
+    gap_lines += [
+        f"- branch from line {src} to {'function exit' if dst < 0 else f'line {dst}'} is never taken"
+        for src, dst in gaps.missing_branches
+    ]
+    import_block = "\n".join(existing_imports) or "(none)"
+    return (
+        "Existing pytest tests for the function below leave some code untested.\n"
+        "Generate ONLY additional test_* functions (plus any imports they need) that exercise "
+        "the uncovered lines and branches listed below.\n"
+        "Do not repeat or modify the existing tests. Do not reuse these test names: "
+        f"{', '.join(existing_test_names) or '(none)'}.\n"
+        "The existing module already has these imports; reuse them and do not import "
+        "the function from anywhere else:\n"
+        f"{import_block}\n\n"
+        "Sanitized function source with line numbers follows.\n\n"
+        f"{_number_lines(fn_source)}\n\n"
+        "Uncovered code:\n"
+        + "\n".join(gap_lines)
+    )
+
+
+def generate_tests_for_coverage_gaps(
+    fn_source: str, existing_tests: str, gaps: CoverageGaps
+) -> str:
+    """Ask the model only for additional tests that target `gaps`."""
+    names: list[str] = []
+    imports: list[str] = []
+    try:
+        for node in ast.parse(existing_tests).body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                names.append(node.name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                imports.append(ast.unparse(node))
+    except SyntaxError:
+        pass
+
+    code = _generate_with_failover(_build_coverage_gap_prompt(fn_source, names, imports, gaps))
+    if not code:
+        raise LLMGenerationError("Model returned empty output.")
+    return code
@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+# Environment variable holding each supported provider's API key.
+API_KEY_ENV_VARS = {
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+}
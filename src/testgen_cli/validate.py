@@ -8,6 +8,8 @@ from dataclasses import dataclass
 class ValidationResult:
     ok: bool
     reason: str = ""
+    # 1-based inclusive (start, end) line spans of rejected top-level nodes.
+    offending_spans: tuple[tuple[int, int], ...] = ()
 
 
 def _contains_markdown_fence(text: str) -> bool:
@@ -51,8 +53,80 @@ def _is_pytest_fixture_function(node: ast.AST) -> bool:
     return False
 
 
+def node_span(node: ast.AST) -> tuple[int, int]:
+    start = node.lineno
+    for dec in getattr(node, "decorator_list", []):
+        start = min(start, dec.lineno)
+    return start, node.end_lineno or node.lineno
+
+
+def _imported_name(node: ast.AST, alias: ast.alias) -> str:
+    if isinstance(node, ast.Import):
+        return alias.asname or alias.name.split(".")[0]
+    return alias.asname or alias.name
+
+
+def drop_redefinitions(additions: str, existing: str) -> str:
+    """
+    Return `additions` without top-level functions whose names are already
+    defined in `existing`, so merged output cannot silently shadow a test,
+    and without imports of names `existing` already imports, so a function
+    is never imported from two different guessed modules.
+
+    Unparseable input is returned unchanged and left to validation.
+    """
+    try:
+        existing_tree = ast.parse(existing)
+        additions_tree = ast.parse(additions)
+    except SyntaxError:
+        return additions
+
+    defined = {
+        node.name
+        for node in existing_tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    imported = {
+        _imported_name(node, alias)
+        for node in existing_tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+        for alias in node.names
+    }
+
+    lines = additions.splitlines()
+    kept: list[str] = []
+    changed = False
+    last_end = 0
+    for node in additions_tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name in defined:
+            changed = True
+            continue
+        start, end = node_span(node)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [a for a in node.names if _imported_name(node, a) not in imported]
+            if len(names) != len(node.names):
+                changed = True
+                last_end = end
+                if names:
+                    node.names = names
+                    kept.append(ast.unparse(node))
+                continue
+        if start > last_end:
+            kept.append("\n".join(lines[start - 1 : end]))
+        else:
+            # Shares a line with the previous node, e.g. `import os; X = 1`.
+            kept.append(ast.unparse(node))
+        last_end = end
+
+    if not changed:
+        return additions
+    return "\n\n".join(kept)
+
+
 def _validate_top_level_structure(tree: ast.Module) -> ValidationResult:
     test_count = 0
+    reasons: list[str] = []
+    spans: list[tuple[int, int]] = []
 
     for node in tree.body:
         # Allow imports
@@ -66,10 +140,15 @@ def _validate_top_level_structure(tree: ast.Module) -> ValidationResult:
                 continue
             if _is_pytest_fixture_function(node):
                 continue
-            return ValidationResult(False, f"non-test function not allowed: {node.name}")
+            reasons.append(f"non-test function not allowed: {node.name}")
+            spans.append(node_span(node))
+            continue
+
+        reasons.append(f"disallowed top-level node: {type(node).__name__}")
+        spans.append(node_span(node))
 
-    
-        return ValidationResult(False, f"disallowed top-level node: {type(node).__name__}")
+    if reasons:
+        return ValidationResult(False, "; ".join(reasons), tuple(spans))
 
     if test_count < 1:
         return ValidationResult(False, "no test function found")
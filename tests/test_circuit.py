@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from testgen_cli.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitConfig
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(tmp_path: Path, clock: FakeClock) -> CircuitBreaker:
+    config = CircuitConfig(min_calls=2, cooldown_seconds=30.0, latency_threshold_seconds=10.0)
+    return CircuitBreaker(tmp_path / "circuit.json", config, clock)
+
+
+def test_opens_after_failure_rate_threshold(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+
+    breaker.record_success("openai", 0.5)
+    breaker.record_failure("openai", 0.5)
+
+    assert breaker.state("openai") == OPEN
+    assert breaker.allow_request("openai") is None
+    assert breaker.allow_request("gemini") is not None
+
+
+def test_opens_when_mean_latency_is_too_high(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+
+    breaker.record_success("gemini", 12.0)
+    breaker.record_success("gemini", 11.0)
+
+    assert breaker.state("gemini") == OPEN
+
+
+def test_half_open_probe_closes_on_success(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("openai", 0.1)
+
+    clock.now += 31.0
+    probe_id = breaker.allow_request("openai")
+    assert probe_id is not None
+    assert breaker.state("openai") == HALF_OPEN
+    # Only one probe at a time.
+    assert breaker.allow_request("openai") is None
+
+    breaker.record_success("openai", 0.1, probe_id)
+    assert breaker.state("openai") == CLOSED
+
+
+def test_half_open_probe_reopens_on_failure(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("openai", 0.1)
+
+    clock.now += 31.0
+    probe_id = breaker.allow_request("openai")
+    assert probe_id is not None
+    breaker.record_failure("openai", 0.1, probe_id)
+
+    assert breaker.state("openai") == OPEN
+    assert breaker.allow_request("openai") is None
+
+
+def test_late_result_does_not_resolve_half_open_probe(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+    in_flight = breaker.allow_request("openai")
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("openai", 0.1)
+
+    clock.now += 31.0
+    assert breaker.allow_request("openai") is not None
+    breaker.record_success("openai", 0.1, in_flight)
+
+    assert breaker.state("openai") == HALF_OPEN
+
+
+def test_late_failure_while_open_does_not_extend_cooldown(tmp_path: Path) -> None:
+    clock = FakeClock()
+    breaker = _breaker(tmp_path, clock)
+    in_flight = breaker.allow_request("openai")
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("openai", 0.1)
+
+    clock.now += 20.0
+    breaker.record_failure("openai", 0.1, in_flight)
+
+    clock.now += 11.0
+    assert breaker.allow_request("openai") is not None
+
+
+def test_state_is_shared_through_state_file(tmp_path: Path) -> None:
+    clock = FakeClock()
+    first = _breaker(tmp_path, clock)
+    first.record_failure("openai", 0.1)
+    first.record_failure("openai", 0.1)
+
+    second = _breaker(tmp_path, clock)
+    assert second.state("openai") == OPEN
+
+
+def test_corrupt_state_file_is_treated_as_empty(tmp_path: Path) -> None:
+    (tmp_path / "circuit.json").write_text("{not json", encoding="utf-8")
+    breaker = _breaker(tmp_path, FakeClock())
+
+    assert breaker.allow_request("openai") is not None
+
+
+def test_malformed_entries_are_normalised(tmp_path: Path) -> None:
+    (tmp_path / "circuit.json").write_text(
+        '{"openai": {"state": "closed"}, "gemini": 5, "other": {"state": "bogus"}}',
+        encoding="utf-8",
+    )
+    breaker = _breaker(tmp_path, FakeClock())
+
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("openai", 0.1)
+    breaker.record_failure("gemini", 0.1)
+    assert breaker.allow_request("other") is not None
+    assert breaker.state("other") == CLOSED
+    assert breaker.state("openai") == OPEN
+    assert breaker.state("gemini") == CLOSED
@@ -3,6 +3,7 @@ from __future__ import annotations
 import pytest
 
 from testgen_cli import cli
+from testgen_cli.coverage_gaps import CoverageGaps
 from testgen_cli.validate import ValidationResult
 
 
@@ -59,3 +60,36 @@ def test_cli_retries_once_after_validation_failure_then_succeeds(
     assert exc.value.code == 0
     assert captured.out == repaired
     assert captured.err == ""
+
+
+def test_cli_fills_coverage_gaps_when_requested(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    first = "def test_one():\n    assert True\n"
+    extra = "def test_two():\n    assert True\n"
+    measured: list[str] = []
+
+    def fake_measure(_src: str, tests: str):
+        measured.append(tests)
+        return CoverageGaps(missing_lines=(3,)) if tests == first else CoverageGaps()
+
+    monkeypatch.setattr(cli, "_read_source_from_path_or_stdin", lambda _path: "source")
+    monkeypatch.setattr(
+        cli, "extract_single_function_source", lambda _src: "def f(x):\n    return x\n"
+    )
+    monkeypatch.setattr(cli, "sanitize_function_source", lambda src: src)
+    monkeypatch.setattr(cli, "generate_unit_tests_for_function", lambda _src: first)
+    monkeypatch.setattr(cli, "measure_coverage_gaps", fake_measure)
+    monkeypatch.setattr(
+        cli, "generate_tests_for_coverage_gaps", lambda _src, _tests, _gaps: extra
+    )
+    monkeypatch.setattr(cli.sys, "argv", ["testgen", "--fill-coverage-gaps"])
+
+    with pytest.raises(SystemExit) as exc:
+        cli.main()
+
+    captured = capsys.readouterr()
+    assert exc.value.code == 0
+    assert "def test_one" in captured.out
+    assert "def test_two" in captured.out
+    assert len(measured) == 2
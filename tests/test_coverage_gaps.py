@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from testgen_cli.coverage_gaps import CoverageGaps, measure_coverage_gaps, merge_generated_tests
+
+CLAMP = """def clamp(value, low, high):
+    if value < low:
+        return low
+    if value > high:
+        return high
+    return value
+"""
+
+
+def test_measure_reports_uncovered_lines_and_branches() -> None:
+    pytest.importorskip("coverage")
+    tests = """from mymodule import clamp
+
+def test_in_range():
+    assert clamp(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps is not None
+    assert gaps.missing_lines == (3, 5)
+    assert (2, 3) in gaps.missing_branches
+    assert (4, 5) in gaps.missing_branches
+
+
+def test_measure_reports_no_gaps_for_full_coverage() -> None:
+    pytest.importorskip("coverage")
+    tests = """def test_all():
+    assert clamp(-1, 0, 10) == 0
+    assert clamp(11, 0, 10) == 10
+    assert clamp(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps == CoverageGaps()
+    assert not gaps
+
+
+def test_measure_keeps_aliased_imports_of_the_function() -> None:
+    pytest.importorskip("coverage")
+    tests = """from mymodule import clamp as c
+
+def test_all():
+    assert c(-1, 0, 10) == 0
+    assert c(11, 0, 10) == 10
+    assert c(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps == CoverageGaps()
+
+
+def test_measure_places_target_import_after_future_imports() -> None:
+    pytest.importorskip("coverage")
+    tests = """from __future__ import annotations
+
+from mymodule import clamp
+
+def test_all():
+    assert clamp(-1, 0, 10) == 0
+    assert clamp(11, 0, 10) == 10
+    assert clamp(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps == CoverageGaps()
+
+
+def test_measure_supports_module_style_access() -> None:
+    pytest.importorskip("coverage")
+    tests = """import mymodule
+import mymodule as mm
+
+def test_all():
+    assert mymodule.clamp(-1, 0, 10) == 0
+    assert mm.clamp(11, 0, 10) == 10
+    assert mymodule.clamp(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps == CoverageGaps()
+
+
+def test_measure_hides_api_keys_from_generated_tests(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("coverage")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-secret")
+    monkeypatch.setenv("GEMINI_API_KEY", "gm-secret")
+    leak = tmp_path / "leak.txt"
+    tests = f"""import os
+
+def test_env():
+    with open({str(leak)!r}, "w") as f:
+        f.write(repr((os.environ.get("OPENAI_API_KEY"), os.environ.get("GEMINI_API_KEY"))))
+    assert clamp(5, 0, 10) == 5
+"""
+    gaps = measure_coverage_gaps(CLAMP, tests)
+
+    assert gaps is not None
+    assert leak.read_text() == "(None, None)"
+
+
+def test_merge_appends_new_tests_and_drops_duplicate_names() -> None:
+    existing = "def test_a():\n    assert True\n"
+    additions = (
+        "import math\n"
+        "\n"
+        "def test_a():\n"
+        "    assert False\n"
+        "\n"
+        "def test_b():\n"
+        "    assert math.pi > 3\n"
+    )
+
+    merged = merge_generated_tests(existing, additions)
+
+    assert merged.count("def test_a") == 1
+    assert "assert False" not in merged
+    assert "import math" in merged
+    assert merged.endswith("def test_b():\n    assert math.pi > 3\n")
+
+
+def test_merge_drops_imports_of_names_already_imported() -> None:
+    existing = "from mymodule import clamp\n\ndef test_a():\n    assert clamp(1, 0, 2) == 1\n"
+    additions = (
+        "from other_guess import clamp\n"
+        "import math\n"
+        "\n"
+        "def test_b():\n"
+        "    assert clamp(math.floor(1.5), 0, 2) == 1\n"
+    )
+
+    merged = merge_generated_tests(existing, additions)
+
+    assert "other_guess" not in merged
+    assert merged.count("import clamp") == 1
+    assert "import math" in merged
+    assert "def test_b" in merged
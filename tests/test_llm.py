@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from testgen_cli import llm
+from testgen_cli.circuit import OPEN, CircuitBreaker
+from testgen_cli.coverage_gaps import CoverageGaps
+
+
+@pytest.fixture
+def state_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "circuit.json"
+    monkeypatch.setenv("TESTGEN_CIRCUIT_STATE", str(path))
+    monkeypatch.setenv("TESTGEN_LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-openai")
+    monkeypatch.setenv("GEMINI_API_KEY", "sk-gemini")
+    return path
+
+
+def _fail(_src: str) -> str:
+    raise llm.LLMGenerationError("OpenAI generation failed. Timeout")
+
+
+def test_fails_over_to_other_provider_on_error(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(llm, "_generate_with_openai", _fail)
+    monkeypatch.setattr(llm, "_generate_with_gemini", lambda _src: "def test_x():\n    pass")
+
+    assert llm.generate_unit_tests_for_function("def f():\n    pass\n").startswith("def test_x")
+
+
+def test_skips_provider_with_open_circuit(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    breaker = CircuitBreaker(state_path)
+    for _ in range(breaker.config.min_calls):
+        breaker.record_failure("openai", 0.1)
+    assert breaker.state("openai") == OPEN
+
+    calls: list[str] = []
+    monkeypatch.setattr(llm, "_generate_with_openai", lambda _src: calls.append("openai") or "x")
+    monkeypatch.setattr(llm, "_generate_with_gemini", lambda _src: calls.append("gemini") or "y")
+
+    assert llm.generate_unit_tests_for_function("def f():\n    pass\n") == "y"
+    assert calls == ["gemini"]
+
+
+def test_does_not_fail_over_to_unconfigured_provider(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("GEMINI_API_KEY")
+    monkeypatch.setattr(llm, "_generate_with_openai", _fail)
+
+    with pytest.raises(llm.LLMGenerationError, match="All providers unavailable"):
+        llm.generate_unit_tests_for_function("def f():\n    pass\n")
+
+
+def test_repair_sends_only_offending_nodes_and_splices_patch(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    invalid = (
+        "import pytest\n"
+        "\n"
+        "def helper():\n"
+        "    return 1\n"
+        "\n"
+        "def test_ok():\n"
+        "    assert True\n"
+    )
+    prompts: list[str] = []
+
+    def fake_openai(prompt: str) -> str:
+        prompts.append(prompt)
+        return "def test_helper():\n    assert 1 == 1"
+
+    monkeypatch.setattr(llm, "_generate_with_openai", fake_openai)
+
+    repaired = llm.regenerate_unit_tests_after_validation_failure(
+        "def f():\n    pass\n", invalid, "non-test function not allowed: helper"
+    )
+
+    assert "def helper():" in prompts[0]
+    assert "def test_ok" not in prompts[0]
+    assert "non-test function not allowed: helper" in prompts[0]
+    assert repaired == (
+        "import pytest\n"
+        "\n"
+        "def test_helper():\n"
+        "    assert 1 == 1\n"
+        "\n"
+        "def test_ok():\n"
+        "    assert True\n"
+    )
+
+
+def test_repair_drops_nodes_when_patch_is_empty(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    invalid = "X = 1\n\ndef test_ok():\n    assert True\n"
+    monkeypatch.setattr(llm, "_generate_with_openai", lambda _prompt: "")
+
+    repaired = llm.regenerate_unit_tests_after_validation_failure(
+        "def f():\n    pass\n", invalid, "disallowed top-level node: Assign"
+    )
+
+    assert repaired == "def test_ok():\n    assert True\n"
+
+
+def test_repair_falls_back_to_full_regeneration_with_reason(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    prompts: list[str] = []
+
+    def fake_openai(prompt: str) -> str:
+        prompts.append(prompt)
+        return "def test_x():\n    assert True"
+
+    monkeypatch.setattr(llm, "_generate_with_openai", fake_openai)
+
+    llm.regenerate_unit_tests_after_validation_failure(
+        "def f():\n    pass\n", "def test_bad(\n", "syntax error: bad"
+    )
+
+    assert "syntax error: bad" in prompts[0]
+    assert "def f():" in prompts[0]
+
+
+def test_repair_regenerates_when_rejected_node_shares_a_line(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    invalid = "import os; X = 1\n\ndef test_ok():\n    assert os.sep\n"
+    prompts: list[str] = []
+
+    def fake_openai(prompt: str) -> str:
+        prompts.append(prompt)
+        return "import os\n\ndef test_ok():\n    assert os.sep"
+
+    monkeypatch.setattr(llm, "_generate_with_openai", fake_openai)
+
+    repaired = llm.regenerate_unit_tests_after_validation_failure(
+        "def f():\n    pass\n", invalid, "disallowed top-level node: Assign"
+    )
+
+    assert "Generate the complete pytest test module again" in prompts[0]
+    assert "Rejected nodes follow" not in prompts[0]
+    assert repaired.startswith("import os")
+
+
+def test_repair_patch_cannot_redefine_kept_tests(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    invalid = "X = 1\n\ndef test_ok():\n    assert True\n"
+    monkeypatch.setattr(
+        llm,
+        "_generate_with_openai",
+        lambda _prompt: "def test_ok():\n    assert False\n\ndef test_new():\n    assert True",
+    )
+
+    repaired = llm.regenerate_unit_tests_after_validation_failure(
+        "def f():\n    pass\n", invalid, "disallowed top-level node: Assign"
+    )
+
+    assert repaired.count("def test_ok") == 1
+    assert "assert False" not in repaired
+    assert "def test_new" in repaired
+
+
+def test_coverage_gap_prompt_includes_existing_imports(
+    state_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    prompts: list[str] = []
+
+    def fake_openai(prompt: str) -> str:
+        prompts.append(prompt)
+        return "def test_more():\n    assert True"
+
+    monkeypatch.setattr(llm, "_generate_with_openai", fake_openai)
+    existing = "import pytest\nfrom mymodule import f\n\ndef test_one():\n    assert f() is None\n"
+
+    llm.generate_tests_for_coverage_gaps(
+        "def f():\n    pass\n", existing, CoverageGaps(missing_lines=(2,))
+    )
+
+    assert "import pytest\nfrom mymodule import f\n" in prompts[0]
+    assert "test_one" in prompts[0]
@@ -70,3 +70,22 @@ def test_add():
     result = validate_generated_tests(output)
     assert result.ok is False
     assert "non-test function not allowed" in result.reason
+
+
+def test_reports_spans_of_all_offending_nodes() -> None:
+    output = """import pytest
+
+def add(a, b):
+    return a + b
+
+def test_add():
+    assert add(1, 2) == 3
+
+VALUE = 3
+"""
+    result = validate_generated_tests(output)
+    assert result.ok is False
+    assert result.reason == (
+        "non-test function not allowed: add; disallowed top-level node: Assign"
+    )
+    assert result.offending_spans == ((3, 4), (9, 9))